@@ -1,24 +1,27 @@
 import os
 import sys
+import asyncio
 import logging
+import io
 import base64
+import hashlib
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from dotenv import load_dotenv
 
-import numpy as np
-import pdfplumber
-import camelot
-from pdf2image import convert_from_path
-import pytesseract
-import cv2
-import requests
+import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_c
+import httpx
+from PIL import Image
+from pydantic import ValidationError
 
-from pipeline.schemas import TaskSchema, RuleSchema
+from pipeline.schemas import TaskSchema, RuleSchema, TASKS_ADAPTER
 from core.utils import parse_utils, merge_utils
 from core.utils.table_parser import LLMTableParser
-from core.llm_client import LLMClient
+from core.utils.cache_utils import ResponseCache, make_cache_key
+from core.llm_client import LLMClient, _loads_json
 
 project_root = Path(__file__).resolve().parent.parent
 sys.path.append(str(project_root))
@@ -26,6 +29,30 @@ load_dotenv(project_root / '.env')
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_VISION_MODEL = "qwen2.5-vl-7b-instruct"
+# Bump when an extraction prompt or its parsing changes: cached extractions from older versions are ignored
+PROMPT_VERSION = 1
+
+
+def extraction_config(doc_type: str) -> dict:
+    """
+    Settings that shape what DocumentExtractor returns for `doc_type`, read from the
+    environment without building an extractor. extract_document_task keys its cache
+    on them, so a new model, prompt or fast-path setting re-extracts the document.
+    """
+    config = {
+        "prompt_version": PROMPT_VERSION,
+        "vision_model": os.getenv("VISION_MODEL_NAME", DEFAULT_VISION_MODEL),
+    }
+    if doc_type == "ura_circular":
+        config["text_fast_path"] = os.getenv("URA_TEXT_FAST_PATH", "1") == "1"
+        if config["text_fast_path"]:
+            config["text_min_chars"] = int(os.getenv("URA_TEXT_MIN_CHARS", "300"))
+            config["text_max_image_area"] = float(os.getenv("URA_TEXT_MAX_IMAGE_AREA", "0.1"))
+            config["text_models"] = [model for _, _, model, _ in LLMClient()._candidates()]
+    return config
+
+
 class DocumentExtractor:
     def __init__(self, ocr_if_needed: bool = True):
         self.ocr_if_needed = ocr_if_needed
@@ -34,18 +61,99 @@ class DocumentExtractor:
 
         # Load vision model config from .env
         self.vision_api_url = os.getenv("VISION_LLM_API_URL", "http://localhost:1234/v1/chat/completions")
-        self.vision_model_name = os.getenv("VISION_MODEL_NAME", "qwen2.5-vl-7b-instruct")
-
-    def _image_to_base64(self, image_path: str) -> str:
-        """Helper to convert saved image to base64 string for API"""
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
-
-    def _extract_with_vision_model(self, image_path: str, prompt_text: str) -> str:
+        self.vision_model_name = os.getenv("VISION_MODEL_NAME", DEFAULT_VISION_MODEL)
+        # Max number of pages in flight against the VLM server at once
+        self.vlm_concurrency = int(os.getenv("VLM_CONCURRENCY", "4"))
+        # Qwen-VL downsamples to its patch grid anyway; 300 dpi pages only inflate the payload
+        self.vlm_dpi = int(os.getenv("VLM_DPI", "200"))
+        self.vlm_max_side = int(os.getenv("VLM_MAX_SIDE", "1568"))
+
+        # Page-image hash -> VLM response, so duplicate/re-run pages skip the model
+        self._vlm_cache = ResponseCache("vlm", enabled=os.getenv("VLM_CACHE_DISABLE") != "1")
+        self._vlm_inflight: Dict[str, asyncio.Task] = {}
+
+        # URA pages that are plain text (enough characters, almost no raster imagery) go to the
+        # text LLM instead of the VLM. Pages with diagrams/scans always go through vision.
+        self.ura_text_fast_path = os.getenv("URA_TEXT_FAST_PATH", "1") == "1"
+        self.text_min_chars = int(os.getenv("URA_TEXT_MIN_CHARS", "300"))
+        self.text_max_image_area = float(os.getenv("URA_TEXT_MAX_IMAGE_AREA", "0.1"))
+
+        # Rasterized pages per (file, dpi): the URA flow exports and VLM-parses the same pages
+        self._page_images: Dict[Tuple[str, int], list] = {}
+        # Pages whose VLM/LLM call or parse failed in the last extraction (their results are empty)
+        self.failed_pages = 0
+
+    def _render_page(self, pdf, i: int, dpi: int) -> Any:
+        page = pdf[i]
+        try:
+            return page.render(scale=dpi / 72).to_pil()
+        finally:
+            page.close()
+
+    def _render_pages(self, file_path: str, dpi: int = None) -> list:
+        """Rasterize the PDF once per extractor; later calls on the same file reuse the pages."""
+        dpi = dpi or self.vlm_dpi
+        key = (str(file_path), dpi)
+        if key not in self._page_images:
+            try:
+                # In-process pdfium render: no poppler subprocess or temp PPM files
+                pdf = pdfium.PdfDocument(str(file_path))
+                try:
+                    self._page_images[key] = [self._render_page(pdf, i, dpi) for i in range(len(pdf))]
+                finally:
+                    pdf.close()
+            except Exception as e:
+                logger.warning(f"pdfium render failed, falling back to pdf2image: {e}")
+                # Optional poppler backend, only imported on this fallback path
+                try:
+                    from pdf2image import convert_from_path
+                except ImportError:
+                    logger.error("pdf2image is not installed; cannot render this PDF.")
+                    raise e
+                self._page_images[key] = convert_from_path(file_path, dpi=dpi)
+        return self._page_images[key]
+
+    def _image_to_jpeg(self, pil_image) -> bytes:
+        """Helper to downscale a rendered page to VLM_MAX_SIDE and JPEG-encode it in memory"""
+        w, h = pil_image.size
+        scale = self.vlm_max_side / max(w, h)
+        if scale < 1:
+            # resize() returns a new image, so the shared rendered page is untouched
+            pil_image = pil_image.resize((round(w * scale), round(h * scale)), Image.LANCZOS)
+
+        buf = io.BytesIO()
+        pil_image.save(buf, "JPEG", quality=75, optimize=True)
+        return buf.getvalue()
+
+    async def _extract_with_vision_model_async(self, client: httpx.AsyncClient, jpeg_bytes: bytes, prompt_text: str, parse):
         """
-        Sends an image to the local Vision-Language Model (VLM) for extraction.
+        Sends a JPEG page to the local Vision-Language Model (VLM) for extraction and
+        returns `parse(response_text)`. Responses are cached by (image hash, prompt, model)
+        only once `parse` accepts them, so a truncated or garbled page is retried on the
+        next run; identical pages in the same run share a single in-flight request.
         """
-        base64_image = self._image_to_base64(image_path)
+        key = make_cache_key(hashlib.sha256(jpeg_bytes).hexdigest(), prompt_text, self.vision_model_name)
+
+        cached = self._vlm_cache.get(key)
+        if cached is not None:
+            try:
+                result = parse(cached)
+                logger.info("[VISION] Cache hit, skipping VLM call.")
+                return result
+            except Exception:
+                # Unparseable entry from an older run: ask the VLM again and overwrite it
+                pass
+
+        if key not in self._vlm_inflight:
+            self._vlm_inflight[key] = asyncio.ensure_future(self._post_vision_request(client, jpeg_bytes, prompt_text))
+        response_text = await self._vlm_inflight[key]
+
+        result = parse(response_text)
+        self._vlm_cache.set(key, response_text)
+        return result
+
+    async def _post_vision_request(self, client: httpx.AsyncClient, jpeg_bytes: bytes, prompt_text: str) -> str:
+        base64_image = base64.b64encode(jpeg_bytes).decode('utf-8')
 
         payload = {
             "model": self.vision_model_name,
@@ -68,13 +176,110 @@ class DocumentExtractor:
         }
 
         try:
-            response = requests.post(self.vision_api_url, headers={"Content-Type": "application/json"}, json=payload)
+            response = await client.post(self.vision_api_url, headers={"Content-Type": "application/json"}, json=payload)
             response.raise_for_status()
             return response.json()['choices'][0]['message']['content']
         except Exception as e:
             logger.error(f"[VISION] API Call failed: {e}")
             return ""
 
+    def _run_vision_pages(self, file_path: str, process_page, page_texts: Dict[int, str] = None, process_text=None) -> list:
+        """
+        Runs `process_page(client, i, jpeg_bytes)` for every page concurrently, bounded by
+        VLM_CONCURRENCY. Each page is rendered and JPEG-encoded inside its own task on
+        worker threads, so that CPU work overlaps with the VLM calls for earlier pages
+        instead of stalling the event loop, and only in-flight pages are held in memory. Results are returned in page order.
+        Pages in `page_texts` are never rendered; `process_text(client, i, text)` handles them.
+        A handler returns None for a failed page: it comes back as [] and is counted in
+        `self.failed_pages`, so callers can tell a partial extraction from a complete one.
+        """
+        self.failed_pages = 0
+        page_texts = page_texts or {}
+        pdf = None
+        images = self._page_images.get((str(file_path), self.vlm_dpi))
+        if images is None:
+            try:
+                pdf = pdfium.PdfDocument(str(file_path))
+            except Exception as e:
+                logger.warning(f"pdfium open failed, rendering all pages up front: {e}")
+                images = self._render_pages(file_path)
+        page_count = len(pdf) if pdf is not None else len(images)
+
+        async def _run_pages():
+            sem = asyncio.Semaphore(self.vlm_concurrency)
+            # pdfium is not thread-safe: one render at a time, in page order
+            render_lock = asyncio.Lock()
+            # In-flight tasks are bound to this event loop
+            self._vlm_inflight = {}
+
+            async def load_page(i):
+                if pdf is None:
+                    img = images[i]
+                else:
+                    async with render_lock:
+                        img = await asyncio.to_thread(self._render_page, pdf, i, self.vlm_dpi)
+                # Resize + JPEG encode are CPU-heavy too; outside the lock they overlap the next render
+                return await asyncio.to_thread(self._image_to_jpeg, img)
+
+            # No timeout: local VLM inference on a dense page can take minutes
+            async with httpx.AsyncClient(timeout=None) as client:
+                async def sem_wrapped(i):
+                    async with sem:
+                        if i in page_texts:
+                            return await process_text(client, i, page_texts[i])
+                        jpeg_bytes = await load_page(i)
+                        return await process_page(client, i, jpeg_bytes)
+
+                return await asyncio.gather(*[sem_wrapped(i) for i in range(page_count)])
+
+        try:
+            results = asyncio.run(_run_pages())
+        finally:
+            if pdf is not None:
+                pdf.close()
+
+        self.failed_pages = sum(r is None for r in results)
+        return [[] if r is None else r for r in results]
+
+    def _text_layer_pages(self, file_path: str) -> Dict[int, str]:
+        """
+        Page index -> text for pages whose text layer carries the content: at least
+        URA_TEXT_MIN_CHARS characters and raster images covering under
+        URA_TEXT_MAX_IMAGE_AREA of the page. Reads pdfium's text layer, no rendering.
+        """
+        texts = {}
+        try:
+            pdf = pdfium.PdfDocument(str(file_path))
+        except Exception as e:
+            logger.warning(f"Text-layer scan failed, sending every page to vision: {e}")
+            return texts
+
+        try:
+            for i in range(len(pdf)):
+                page = pdf[i]
+                try:
+                    width, height = page.get_size()
+                    image_area = 0.0
+                    for obj in page.get_objects(filter=[pdfium_c.FPDF_PAGEOBJ_IMAGE], max_depth=2):
+                        left, bottom, right, top = obj.get_bounds()
+                        image_area += (right - left) * (top - bottom)
+                    if image_area > self.text_max_image_area * width * height:
+                        continue
+
+                    textpage = page.get_textpage()
+                    try:
+                        text = textpage.get_text_range().strip()
+                    finally:
+                        textpage.close()
+                    if len(text) >= self.text_min_chars:
+                        texts[i] = text
+                finally:
+                    page.close()
+        finally:
+            pdf.close()
+
+        return texts
+
     def extract_project_schedule_vision(self, file_path: str) -> List[TaskSchema]:
         """
         New VLM-based extractor. Replaces the old 'hybrid' text parser.
@@ -82,68 +287,72 @@ class DocumentExtractor:
         """
         logger.info(f"[VISION] Starting extraction for {file_path}")
 
-        # 1. Convert PDF Pages to Images
-        try:
-            images = convert_from_path(file_path, dpi=300)
-        except Exception as e:
-            logger.error(f"Failed to convert PDF to images: {e}")
-            return []
-
-        all_tasks = []
-        temp_dir = project_root / "temp_images"
-        os.makedirs(temp_dir, exist_ok=True)
+        # Prompt optimized for Vision Models reading Gantt/Tables
+        prompt = """
+        Analyze this Project Schedule document image.
+        Extract all rows from the table.
+        
+        Return the data strictly as a JSON object with this key: "tasks".
+        Each task must have:
+        - "task_id": (string/number from ID column)
+        - "task_name": (text from Task Name column)
+        - "duration_days": (integer, remove 'days' text)
+        - "start_date": (YYYY-MM-DD format if possible, else raw string)
+        - "finish_date": (YYYY-MM-DD format if possible, else raw string)
+
+        If a row is a summary or header, ignore it.
+        Do not include markdown formatting (```json), just the raw JSON.
+        """
 
-        # 2. Process each page as an image
-        for i, img in enumerate(images):
-            temp_img_path = temp_dir / f"page_{i}.jpg"
-            img.save(temp_img_path, "JPEG")
+        # Parse one VLM reply; raises if it isn't a usable page (so it isn't cached)
+        def parse_tasks(response_text) -> List[TaskSchema]:
+            # Clean markdown code blocks if the model adds them
+            clean_json = response_text.replace("```json", "").replace("```", "").strip()
+            data = _loads_json(clean_json)
 
-            logger.info(f"[VISION] Processing Page {i+1}...")
+            rows = [
+                {
+                    "task_id": str(item.get("task_id", "")),
+                    "task_name": item.get("task_name"),
+                    "duration_days": item.get("duration_days"),
+                    "start_date": item.get("start_date"),
+                    "finish_date": item.get("finish_date"),
+                }
+                for item in data.get("tasks", [])
+            ]
 
-            # Prompt optimized for Vision Models reading Gantt/Tables
-            prompt = """
-            Analyze this Project Schedule document image.
-            Extract all rows from the table.
-            
-            Return the data strictly as a JSON object with this key: "tasks".
-            Each task must have:
-            - "task_id": (string/number from ID column)
-            - "task_name": (text from Task Name column)
-            - "duration_days": (integer, remove 'days' text)
-            - "start_date": (YYYY-MM-DD format if possible, else raw string)
-            - "finish_date": (YYYY-MM-DD format if possible, else raw string)
-
-            If a row is a summary or header, ignore it.
-            Do not include markdown formatting (```json), just the raw JSON.
-            """
-
-            response_text = self._extract_with_vision_model(str(temp_img_path), prompt)
-
-            # 3. Parse JSON Response
+            # Validate against Schema: whole page in one call, per row only if something is invalid
             try:
-                # Clean markdown code blocks if the model adds them
-                clean_json = response_text.replace("```json", "").replace("```", "").strip()
-                data = json.loads(clean_json)
-
-                for item in data.get("tasks", []):
-                    # Validate against Schema
+                return TASKS_ADAPTER.validate_python(rows)
+            except ValidationError:
+                page_tasks = []
+                for row in rows:
                     try:
-                        task = TaskSchema(
-                            task_id=str(item.get("task_id", "")),
-                            task_name=item.get("task_name"),
-                            duration_days=item.get("duration_days"),
-                            start_date=item.get("start_date"),
-                            finish_date=item.get("finish_date")
-                        )
-                        all_tasks.append(task)
+                        page_tasks.append(TaskSchema(**row))
                     except Exception as ve:
                         logger.warning(f"Skipping invalid task: {ve}")
+                return page_tasks
 
-            except json.JSONDecodeError:
-                logger.error(f"[VISION] Failed to parse JSON from Page {i+1}. Raw: {response_text[:100]}...")
+        # Render + process each page as an image (pages run concurrently)
+        async def process_page(client, i, jpeg_bytes):
+            logger.info(f"[VISION] Processing Page {i+1}...")
 
-            # Cleanup temp image
-            os.remove(temp_img_path)
+            try:
+                return await self._extract_with_vision_model_async(client, jpeg_bytes, prompt, parse_tasks)
+            except json.JSONDecodeError as e:
+                logger.error(f"[VISION] Failed to parse JSON from Page {i+1}: {e}")
+            except Exception as e:
+                # e.g. a JSON list or non-dict items: lose this page, not the whole document
+                logger.error(f"[VISION] Failed page {i+1}: {e}")
+
+            return None
+
+        try:
+            page_results = self._run_vision_pages(file_path, process_page)
+        except Exception as e:
+            logger.error(f"Failed to render PDF pages: {e}")
+            return []
+        all_tasks = [task for page_tasks in page_results for task in page_tasks]
 
         logger.info(f"[VISION] Completed. Extracted {len(all_tasks)} valid tasks.")
         return all_tasks
@@ -154,45 +363,69 @@ class DocumentExtractor:
         """
         logger.info(f"[URA-VISION] Starting extraction for {file_path}")
 
-        images = convert_from_path(file_path, dpi=300)
-        temp_dir = project_root / "temp_images"
-        os.makedirs(temp_dir, exist_ok=True)
-
-        all_rules = []
+        prompt = """
+        This is a regulatory document about Gross Floor Area (GFA) definitions.
+        Extract 'Regulatory Rules' found on this page.
+        Pay attention to text descriptions AND diagrams (e.g. "GFA is measured to the middle of the wall").
+        
+        Return strictly JSON: { "rules": [ { "rule_id": "...", "rule_summary": "...", "measurement_basis": "..." } ] }
+        If no rules are found, return { "rules": [] }.
+        """
 
-        for i, img in enumerate(images):
-            temp_img_path = temp_dir / f"ura_page_{i}.jpg"
-            img.save(temp_img_path, "JPEG")
+        text_prompt = """
+        This is the text of one page of a regulatory document about Gross Floor Area (GFA) definitions.
+        Extract 'Regulatory Rules' found on this page.
 
-            prompt = """
-            This is a regulatory document about Gross Floor Area (GFA) definitions.
-            Extract 'Regulatory Rules' found on this page.
-            Pay attention to text descriptions AND diagrams (e.g. "GFA is measured to the middle of the wall").
-            
-            Return strictly JSON: { "rules": [ { "rule_id": "...", "rule_summary": "...", "measurement_basis": "..." } ] }
-            If no rules are found, return { "rules": [] }.
-            """
+        Return strictly JSON: { "rules": [ { "rule_id": "...", "rule_summary": "...", "measurement_basis": "..." } ] }
+        If no rules are found, return { "rules": [] }.
 
-            response_text = self._extract_with_vision_model(str(temp_img_path), prompt)
+        Page text:
+        """
 
+        def rules_from(data) -> List[RuleSchema]:
+            # Raises on a reply of the wrong shape, so it counts as a failed page and isn't cached
+            rules = data.get("rules") if isinstance(data, dict) else None
+            if not isinstance(rules, list):
+                raise ValueError(f"expected a 'rules' list, got {type(rules).__name__}")
+
+            page_rules = []
+            for item in rules:
+                try:
+                    rule = RuleSchema(
+                        rule_id=str(item.get("rule_id", "General")),
+                        rule_summary=str(item.get("rule_summary", "")),
+                        measurement_basis=str(item.get("measurement_basis", "N/A"))
+                    )
+                    page_rules.append(rule)
+                except Exception:
+                    continue
+            return page_rules
+
+        def parse_rules(response_text) -> List[RuleSchema]:
+            clean_json = response_text.replace("```json", "").replace("```", "").strip()
+            return rules_from(_loads_json(clean_json))
+
+        async def process_page(client, i, jpeg_bytes):
             try:
-                clean_json = response_text.replace("```json", "").replace("```", "").strip()
-                data = json.loads(clean_json)
-
-                for item in data.get("rules", []):
-                    try:
-                        rule = RuleSchema(
-                            rule_id=str(item.get("rule_id", "General")),
-                            rule_summary=str(item.get("rule_summary", "")),
-                            measurement_basis=str(item.get("measurement_basis", "N/A"))
-                        )
-                        all_rules.append(rule)
-                    except Exception:
-                        continue
+                return await self._extract_with_vision_model_async(client, jpeg_bytes, prompt, parse_rules)
             except Exception as e:
                 logger.error(f"[URA-VISION] Failed page {i}: {e}")
+                return None
 
-            os.remove(temp_img_path)
+        async def process_text(client, i, text):
+            # Text LLM (cached, same fallback chain as the table parser) instead of a VLM image call
+            try:
+                return await self.llm_client.aask_json(client, text_prompt + text, parse=rules_from)
+            except Exception as e:
+                logger.error(f"[URA-TEXT] Failed page {i}: {e}")
+                return None
+
+        page_texts = self._text_layer_pages(file_path) if self.ura_text_fast_path else {}
+        if page_texts:
+            logger.info(f"[URA-VISION] {len(page_texts)} text-only pages routed to the text LLM.")
+
+        page_results = self._run_vision_pages(file_path, process_page, page_texts, process_text)
+        all_rules = [rule for page_rules in page_results for rule in page_rules]
 
         return all_rules
 
@@ -204,15 +437,21 @@ class DocumentExtractor:
             os.makedirs(out_path)
 
         logger.info(f"Processing images for: {file_path}")
+
+        def save_page(i, im):
+            # Construct output path
+            image_filename = out_path / f"ura_page_{i+1}.png"
+            im.save(str(image_filename))
+            logger.info(f"Saved image: {image_filename}")
+
         try:
-            with pdfplumber.open(file_path) as pdf:
-                for i, page in enumerate(pdf.pages):
-                    im = page.to_image(resolution=300)
-
-                    # Construct output path
-                    image_filename = out_path / f"ura_page_{i+1}.png"
-                    im.save(str(image_filename))
-                    logger.info(f"Saved image: {image_filename}")
+            # Shares the rasterization with extract_ura_rules_vision
+            images = self._render_pages(file_path)
+
+            # PNG encoding releases the GIL, so pages encode in parallel threads
+            workers = int(os.getenv("IMAGE_EXPORT_WORKERS", "4"))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(save_page, range(len(images)), images))
         except Exception as e:
             logger.error(f"Image extraction failed: {e}")
 
@@ -1,11 +1,126 @@
 import os
 import json
 import re
-import ast
+import httpx
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from loguru import logger
 from typing import List, Dict, Any, Optional
 
+from core.utils.cache_utils import ResponseCache, make_cache_key
+
+# Static system turn shared by every request body (never mutated)
+_SYSTEM_MESSAGE = {"role": "system", "content": "You are a data extraction agent. Return ONLY valid JSON."}
+
+# Start of the first JSON object/array in a model response
+_JSON_START_RE = re.compile(r"[\{\[]")
+
+
+def _extract_json_span(content: str) -> str:
+    """
+    Returns the first balanced {...} / [...] block in `content`.
+    Single linear pass tracking bracket depth and quote state, so braces inside
+    strings are ignored and messy responses can't trigger regex backtracking.
+    Falls back to everything from the first bracket if the block never closes.
+    """
+    match = _JSON_START_RE.search(content)
+    if not match:
+        return content
+
+    start = match.start()
+    depth = 0
+    quote = None
+    escaped = False
+
+    for i in range(start, len(content)):
+        ch = content[i]
+        if quote:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == quote:
+                quote = None
+        elif ch == '"' or ch == "'":
+            # Single quotes only appear outside strings in Python-style dicts
+            quote = ch
+        elif ch == "{" or ch == "[":
+            depth += 1
+        elif ch == "}" or ch == "]":
+            depth -= 1
+            if depth == 0:
+                return content[start:i + 1]
+
+    return content[start:]
+
+
+def _loads_json(text: str) -> Any:
+    """
+    orjson fast path; stdlib json (non-strict) covers what orjson rejects,
+    e.g. NaN or raw newlines inside strings. Raises json.JSONDecodeError.
+    """
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return json.loads(text, strict=False)
+
+
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+def _repair_json(content: str) -> str:
+    """
+    Single-pass fix-up for almost-JSON (Python-style dicts) from LLMs:
+    single-quoted strings become double-quoted, trailing commas before } / ]
+    are dropped and bare True/False/None become true/false/null.
+    """
+    out = []
+    quote = None
+    i, n = 0, len(content)
+
+    while i < n:
+        ch = content[i]
+        if quote:
+            if ch == "\\" and i + 1 < n:
+                nxt = content[i + 1]
+                # \' is legal in Python strings but not in JSON, whichever quote encloses it
+                out.append("'" if nxt == "'" else ch + nxt)
+                i += 2
+                continue
+            if ch == quote:
+                out.append('"')
+                quote = None
+            elif ch == '"':
+                # Only reachable inside a single-quoted string
+                out.append('\\"')
+            else:
+                out.append(ch)
+        elif ch == '"' or ch == "'":
+            quote = ch
+            out.append('"')
+        elif ch == ",":
+            j = i + 1
+            while j < n and content[j].isspace():
+                j += 1
+            if j < n and content[j] not in "}]":
+                out.append(ch)
+        elif ch.isalpha():
+            j = i
+            while j < n and (content[j].isalnum() or content[j] == "_"):
+                j += 1
+            word = content[i:j]
+            out.append(_PY_LITERALS.get(word, word))
+            i = j
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    return "".join(out)
+
+
 class LLMClient:
 
     def __init__(self, base_url: Optional[str] = None, model: Optional[str] = None):
@@ -19,28 +134,43 @@ class LLMClient:
         self.openai_base_url = "https://api.openai.com/v1/chat/completions"
         self.openai_model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 
+        # Keep-alive pool shared by all calls (thread-safe for the table parser's workers)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=Retry(total=2, backoff_factor=0.3))
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+        # Parsed responses keyed by (prompt, models, sampling params); LLM_CACHE_DISABLE=1 bypasses
+        self._cache = ResponseCache("llm", enabled=os.getenv("LLM_CACHE_DISABLE") != "1")
+
     def _clean_and_extract_json(self, content: str) -> str:
-        content = content.strip()
-        # Regex to find the JSON block ({...} or [...])
-        match = re.search(r"(\{.*\}|\[.*\])", content, re.DOTALL)
-        if match:
-            content = match.group(0)
-        return content
+        return _extract_json_span(content.strip())
 
-    def _make_llm_request(self, url: str, model: str, headers: dict, prompt: str, temperature: float, max_tokens: int) -> Optional[str]:
-        body = {
+    def _candidates(self):
+        """(source, url, model, headers) in fallback order: OpenAI if configured, then the local LLM."""
+        if self.openai_api_key:
+            headers = {
+                "Authorization": f"Bearer {self.openai_api_key}",
+                "Content-Type": "application/json"
+            }
+            yield "OpenAI", self.openai_base_url, self.openai_model, headers
+
+        yield "Local", self.local_base_url, self.local_model, {"Content-Type": "application/json"}
+
+    def _request_body(self, model: str, prompt: str, temperature: float, max_tokens: int) -> dict:
+        return {
             "model": model,
-            "messages": [
-                {"role": "system", "content": "You are a data extraction agent. Return ONLY valid JSON."},
-                {"role": "user", "content": prompt},
-            ],
+            "messages": [_SYSTEM_MESSAGE, {"role": "user", "content": prompt}],
             "temperature": temperature,
             "max_tokens": max_tokens,
             "stream": False
         }
 
+    def _make_llm_request(self, url: str, model: str, headers: dict, prompt: str, temperature: float, max_tokens: int) -> Optional[str]:
+        body = self._request_body(model, prompt, temperature, max_tokens)
+
         try:
-            resp = requests.post(url, headers=headers, json=body, timeout=120)
+            resp = self._session.post(url, headers=headers, json=body, timeout=120)
             resp.raise_for_status()
             raw = resp.json()
 
@@ -53,80 +183,140 @@ class LLMClient:
             logger.warning(f"[LLM Client] Request to {model} ({url}) failed: {e}")
             return None
 
+    async def _amake_llm_request(self, client: httpx.AsyncClient, url: str, model: str, headers: dict, prompt: str, temperature: float, max_tokens: int) -> Optional[str]:
+        body = self._request_body(model, prompt, temperature, max_tokens)
+
+        try:
+            resp = await client.post(url, headers=headers, json=body, timeout=120)
+            resp.raise_for_status()
+            raw = resp.json()
+
+            if "choices" not in raw or not raw["choices"]:
+                return None
+
+            return raw["choices"][0]["message"]["content"]
+
+        except Exception as e:
+            logger.warning(f"[LLM Client] Request to {model} ({url}) failed: {e}")
+            return None
+
+    def _cache_key(self, prompt: str, temperature: float, max_tokens: int) -> str:
+        # The answering model isn't known until the call, so key on every candidate
+        openai_model = self.openai_model if self.openai_api_key else None
+        return make_cache_key(prompt.strip(), openai_model, self.local_model, temperature, max_tokens)
+
     def ask_json(self, prompt: str, temperature: float = 0.0, max_tokens: int = -1) -> dict:
-        content = None
-        used_source = None
+        key = self._cache_key(prompt, temperature, max_tokens)
 
-        if self.openai_api_key:
-            headers = {
-                "Authorization": f"Bearer {self.openai_api_key}",
-                "Content-Type": "application/json"
-            }
-            content = self._make_llm_request(
-                self.openai_base_url,
-                self.openai_model,
-                headers,
-                prompt,
-                temperature,
-                max_tokens
-            )
-            if content:
-                used_source = "OpenAI"
+        cached = self._cache.get(key)
+        if cached is not None:
+            return _loads_json(cached)
 
-        if content is None:
-            if self.openai_api_key:
+        result = self._ask_json_uncached(prompt, temperature, max_tokens)
+
+        # Empty results are failures; don't pin them in the cache
+        if result:
+            self._cache.set(key, json.dumps(result))
+        return result
+
+    async def aask_json(self, client: httpx.AsyncClient, prompt: str, temperature: float = 0.0, max_tokens: int = -1, parse=None):
+        """
+        Async ask_json over a caller-owned httpx client (shared keep-alive pool). Same cache.
+        With `parse`, returns `parse(result)` and only caches a reply that `parse` accepts,
+        so a reply of the wrong shape is asked again on the next run instead of pinned.
+        """
+        parse = parse or (lambda data: data)
+        key = self._cache_key(prompt, temperature, max_tokens)
+
+        cached = self._cache.get(key)
+        if cached is not None:
+            try:
+                return parse(_loads_json(cached))
+            except Exception:
+                # Unusable entry from an older run: ask again and overwrite it
+                pass
+
+        content, used_source = None, None
+        for source, url, model, headers in self._candidates():
+            if source == "Local" and self.openai_api_key:
                 logger.info("OpenAI failed or unavailable. Falling back to Local LLM...")
+            content = await self._amake_llm_request(client, url, model, headers, prompt, temperature, max_tokens)
+            if content:
+                used_source = source
+                break
+
+        result = self._parse_content(content, used_source)
+        parsed = parse(result)
+
+        if result:
+            self._cache.set(key, json.dumps(result))
+        return parsed
 
-            headers = {"Content-Type": "application/json"}
-            content = self._make_llm_request(
-                self.local_base_url,
-                self.local_model,
-                headers,
-                prompt,
-                temperature,
-                max_tokens
-            )
+    def _ask_json_uncached(self, prompt: str, temperature: float, max_tokens: int) -> dict:
+        content, used_source = None, None
+        for source, url, model, headers in self._candidates():
+            if source == "Local" and self.openai_api_key:
+                logger.info("OpenAI failed or unavailable. Falling back to Local LLM...")
+            content = self._make_llm_request(url, model, headers, prompt, temperature, max_tokens)
             if content:
-                used_source = "Local"
+                used_source = source
+                break
+
+        return self._parse_content(content, used_source)
 
+    def _parse_content(self, content: Optional[str], used_source: Optional[str]) -> dict:
         if content is None:
             logger.error("llm not available") # Exact log message requested
             return {}
 
         cleaned = self._clean_and_extract_json(content)
 
+        # Non-strict fallback inside _loads_json already tolerates raw newlines in strings
         try:
-            return json.loads(cleaned)
+            return _loads_json(cleaned)
         except json.JSONDecodeError:
             pass
 
         try:
-            return json.loads(cleaned.replace('\n', ' '))
+            return _loads_json(_repair_json(cleaned))
         except json.JSONDecodeError:
             pass
 
-        try:
-            return ast.literal_eval(cleaned)
-        except (ValueError, SyntaxError):
-            pass
-
         logger.error(f"[LLM JSON] All parsing attempts failed for source: {used_source}")
         logger.debug(f"Failed Content: {cleaned[:500]}...")
         return {}
 
+    @staticmethod
+    def _table_chunk_prompt(rows: List[List[str]]) -> str:
+        csv_block = "\n".join([", ".join(str(c) for c in r) for r in rows])
+        return f"Extract tasks to JSON: {{'tasks': [{{'task_id': int, 'task_name': str, ...}}]}}\nData:\n{csv_block}"
+
+    @staticmethod
+    def _as_tasks(result) -> Dict[str, Any]:
+        if isinstance(result, list): return {"tasks": result}
+        if "tasks" in result: return result
+        return {"tasks": []}
+
     def parse_table_chunk(self, prompt: Optional[str] = None, rows: Optional[List[List[str]]] = None, **kwargs) -> Dict[str, Any]:
         temp = kwargs.get('temperature', 0.0)
         tokens = kwargs.get('max_tokens', -1)
 
         if not prompt and rows:
-            csv_block = "\n".join([", ".join(str(c) for c in r) for r in rows])
-            prompt = f"Extract tasks to JSON: {{'tasks': [{{'task_id': int, 'task_name': str, ...}}]}}\nData:\n{csv_block}"
+            prompt = self._table_chunk_prompt(rows)
 
         if not prompt:
             return {"tasks": []}
 
-        result = self.ask_json(prompt, temperature=temp, max_tokens=tokens)
+        return self._as_tasks(self.ask_json(prompt, temperature=temp, max_tokens=tokens))
 
-        if isinstance(result, list): return {"tasks": result}
-        if "tasks" in result: return result
-        return {"tasks": []}
\ No newline at end of file
+    async def aparse_table_chunk(self, client: httpx.AsyncClient, prompt: Optional[str] = None, rows: Optional[List[List[str]]] = None, **kwargs) -> Dict[str, Any]:
+        temp = kwargs.get('temperature', 0.0)
+        tokens = kwargs.get('max_tokens', -1)
+
+        if not prompt and rows:
+            prompt = self._table_chunk_prompt(rows)
+
+        if not prompt:
+            return {"tasks": []}
+
+        return self._as_tasks(await self.aask_json(client, prompt, temperature=temp, max_tokens=tokens))
@@ -0,0 +1,116 @@
+# core/utils/cache_utils.py
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+from loguru import logger
+
+project_root = Path(__file__).resolve().parent.parent.parent
+CACHE_DIR = project_root / ".llm_cache"
+
+# Keys per SELECT ... IN (...): stays under SQLite's bound-parameter limit
+_SQL_BATCH = 500
+
+
+def make_cache_key(*parts: Any) -> str:
+    """Stable SHA-256 key over any JSON-serializable parts (prompt, model, hashes...)."""
+    payload = json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent key -> text cache for model responses.
+    Hot keys stay in memory; everything is written through to a SQLite file
+    under .llm_cache/ so reruns on the same inputs skip the model call.
+    The file is only opened on first use, so importing a module that holds a
+    cache never touches the disk.
+    Nothing is evicted: the files (and the in-memory layer, per process) grow
+    with every distinct input. Delete .llm_cache/<name>.sqlite3 to reclaim space.
+    """
+
+    def __init__(self, name: str, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self._memory: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._conn = None
+        self._opened = False
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        """SQLite connection, opened on first call; None if unavailable. Call with the lock held."""
+        if self._opened:
+            return self._conn
+        self._opened = True
+
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            self._conn = sqlite3.connect(str(CACHE_DIR / f"{self.name}.sqlite3"), check_same_thread=False)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._conn.commit()
+        except (OSError, sqlite3.Error) as e:
+            # Read-only disk etc. -> keep working with the in-memory layer only
+            logger.warning(f"[Cache] Persistent cache '{self.name}' unavailable, using memory only: {e}")
+            self._conn = None
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            if key in self._memory:
+                return self._memory[key]
+            conn = self._db()
+            if conn is None:
+                return None
+
+            row = conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._memory[key] = row[0]
+                return row[0]
+        return None
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """Cached values for whichever `keys` are present: one SELECT per _SQL_BATCH misses."""
+        if not self.enabled:
+            return {}
+
+        keys = list(keys)
+        with self._lock:
+            found = {k: self._memory[k] for k in keys if k in self._memory}
+            missing = [k for k in keys if k not in found]
+            conn = self._db() if missing else None
+            if conn is None:
+                return found
+
+            for start in range(0, len(missing), _SQL_BATCH):
+                batch = missing[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(f"SELECT key, value FROM cache WHERE key IN ({placeholders})", batch).fetchall()
+                for k, v in rows:
+                    self._memory[k] = v
+                    found[k] = v
+        return found
+
+    def set(self, key: str, value: str):
+        self.set_many({key: value})
+
+    def set_many(self, items: Dict[str, str]):
+        """Writes all entries in one transaction (a single commit)."""
+        if not self.enabled or not items:
+            return
+
+        with self._lock:
+            self._memory.update(items)
+            conn = self._db()
+            if conn is None:
+                return
+            try:
+                conn.executemany("INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)", items.items())
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"[Cache] Failed to persist entries: {e}")
@@ -1,20 +1,80 @@
 # core/utils/chunk_utils.py
 
-import uuid
+import os
+import heapq
+import base64
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Tuple
+import numpy as np
+import torch
+from loguru import logger
 from sentence_transformers import SentenceTransformer
 from chromadb import PersistentClient
 
 from pipeline.schemas import TaskSchema
+from core.utils.cache_utils import ResponseCache, make_cache_key
 
 
 _MODEL = None
 _CHROMA = None
 
+# Chunk vectors keyed by (text, model identity), so re-runs only encode new or changed chunks.
+# EMBED_CACHE_DISABLE=1 bypasses. The SQLite file is opened on first use, not at import.
+_EMBED_CACHE = ResponseCache("embeddings", enabled=os.getenv("EMBED_CACHE_DISABLE") != "1")
+
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# Chunks encoded + written to Chroma per round trip
+INDEX_BATCH_SIZE = int(os.getenv("CHROMA_INDEX_BATCH_SIZE", "512"))
+# Tasks listed per building summary. MiniLM truncates input at 256 word pieces,
+# so lines past roughly this point never reach the embedding anyway.
+SUMMARY_TOP_TASKS = int(os.getenv("SUMMARY_TOP_TASKS", "20"))
+# "onnx" = int8-quantized ONNX Runtime export (needs optimum[onnxruntime]), "torch" = original weights
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "onnx")
+EMBED_ONNX_FILE = os.getenv("EMBED_ONNX_FILE", "onnx/model_qint8_avx512_vnni.onnx")
+# "auto" = cuda when available, else cpu. On GPU the fp16 torch model is used (the int8 ONNX export is CPU-only).
+EMBED_DEVICE = os.getenv("EMBED_DEVICE", "auto")
+
+# Chroma collection settings, shared with pipeline/api.py so whichever side creates
+# the collection first builds the same index. HNSW params take effect at creation.
+COLLECTION_NAME = "project_docs"
+COLLECTION_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:M": int(os.getenv("CHROMA_HNSW_M", "16")),
+    "hnsw:construction_ef": int(os.getenv("CHROMA_HNSW_CONSTRUCTION_EF", "200")),
+    "hnsw:search_ef": int(os.getenv("CHROMA_HNSW_SEARCH_EF", "64")),
+    "hnsw:batch_size": int(os.getenv("CHROMA_HNSW_BATCH_SIZE", "256")),
+}
+
+def load_embedding_model() -> SentenceTransformer:
+    """
+    Builds the embedding model used for BOTH ingest and /search, so stored and
+    query vectors always come from the same backend.
+    """
+    device = EMBED_DEVICE
+    if device == "auto":
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    if device.startswith("cuda"):
+        return SentenceTransformer(EMBED_MODEL_NAME, device=device, model_kwargs={"torch_dtype": torch.float16})
+
+    if EMBED_BACKEND == "onnx":
+        try:
+            return SentenceTransformer(
+                EMBED_MODEL_NAME,
+                backend="onnx",
+                device=device,
+                model_kwargs={"file_name": EMBED_ONNX_FILE},
+            )
+        except Exception as e:
+            logger.warning(f"ONNX embedding backend unavailable, using torch: {e}")
+    return SentenceTransformer(EMBED_MODEL_NAME, device=device)
+
 def _get_model():
     global _MODEL
     if _MODEL is None:
-        _MODEL = SentenceTransformer("all-MiniLM-L6-v2")
+        _MODEL = load_embedding_model()
     return _MODEL
 
 
@@ -24,29 +84,48 @@ def _get_chroma(persist_dir="./chroma_db"):
         _CHROMA = PersistentClient(path=persist_dir)
     return _CHROMA
 
+def chunk_id(text: str, meta: dict) -> str:
+    """
+    Content-addressed chunk id: re-ingesting the same document produces the same ids,
+    so the upsert in index_chunks_to_chroma updates in place instead of duplicating.
+    """
+    key = f"{meta.get('type')}|{meta.get('building')}|{text}"
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
 def aggregate_tasks_by_building(tasks: List[TaskSchema]):
-    groups = {}
+    summaries = {}
 
+    # Single pass: group + running totals, no second sweep over each group
     for t in tasks:
         building = getattr(t, "building", None) or "UNSPECIFIED"
-        groups.setdefault(building, []).append(t)
-
-    summaries = {}
-
-    for building, rows in groups.items():
-        total_days = sum((r.duration_days or 0) for r in rows)
-        longest = max(rows, key=lambda r: (r.duration_days or 0))
-
-        summaries[building] = {
-            "building": building,
-            "tasks": rows,
-            "num_tasks": len(rows),
-            "total_duration_days": total_days,
-            "longest_task": {
-                "task_id": longest.task_id,
-                "task_name": longest.task_name,
-                "duration_days": longest.duration_days,
+        days = t.duration_days or 0
+
+        s = summaries.get(building)
+        if s is None:
+            s = summaries[building] = {
+                "building": building,
+                "tasks": [],
+                "num_tasks": 0,
+                "total_duration_days": 0,
+                "_longest": t,
+                "_longest_days": days,
             }
+        elif days > s["_longest_days"]:
+            # Strict > keeps the first longest task on ties, same as max()
+            s["_longest"] = t
+            s["_longest_days"] = days
+
+        s["tasks"].append(t)
+        s["num_tasks"] += 1
+        s["total_duration_days"] += days
+
+    for s in summaries.values():
+        longest = s.pop("_longest")
+        del s["_longest_days"]
+        s["longest_task"] = {
+            "task_id": longest.task_id,
+            "task_name": longest.task_name,
+            "duration_days": longest.duration_days,
         }
 
     return summaries
@@ -54,17 +133,17 @@ def aggregate_tasks_by_building(tasks: List[TaskSchema]):
 def create_semantic_chunks(tasks: List[TaskSchema], summaries: Dict[str, Dict]):
     row_chunks = []
     summary_chunks = []
+    # Identical rows hash to the same id; Chroma rejects duplicate ids in one write
+    seen_ids = set()
 
     # Row-Level Chunks
     for t in tasks:
-        text = (
-            f"Task {t.task_id}: {t.task_name}. "
-            f"Duration: {t.duration_days} days. "
-        )
+        parts = [f"Task {t.task_id}: {t.task_name}.", f"Duration: {t.duration_days} days."]
         if t.start_date:
-            text += f"Start: {t.start_date}. "
+            parts.append(f"Start: {t.start_date}.")
         if t.finish_date:
-            text += f"Finish: {t.finish_date}. "
+            parts.append(f"Finish: {t.finish_date}.")
+        text = " ".join(parts)
 
         building = getattr(t, "building", None) or "UNKNOWN"
 
@@ -75,9 +154,14 @@ def create_semantic_chunks(tasks: List[TaskSchema], summaries: Dict[str, Dict]):
             "source": "Schedule",
         }
 
+        cid = chunk_id(text, meta)
+        if cid in seen_ids:
+            continue
+        seen_ids.add(cid)
+
         row_chunks.append({
-            "id": str(uuid.uuid4()),
-            "text": text.strip(),
+            "id": cid,
+            "text": text,
             "metadata": meta,
         })
 
@@ -90,15 +174,20 @@ def create_semantic_chunks(tasks: List[TaskSchema], summaries: Dict[str, Dict]):
             f"Longest task: {s['longest_task']['task_name']} ({s['longest_task']['duration_days']} days)",
         ]
 
-        for t in sorted(s["tasks"], key=lambda r: r.duration_days or 0, reverse=True):
+        # O(N log k) top-k instead of sorting every task; same order as sorted(...)[:k]
+        top = heapq.nlargest(SUMMARY_TOP_TASKS, s["tasks"], key=lambda r: r.duration_days or 0)
+        for t in top:
             lines.append(f"- {t.task_name} ({t.duration_days} days)")
+        if s["num_tasks"] > len(top):
+            lines.append(f"... and {s['num_tasks'] - len(top)} shorter tasks")
 
         text = "\n".join(lines)
 
+        meta = {"type": "summary", "building": b, "source": "Schedule"}
         summary_chunks.append({
-            "id": str(uuid.uuid4()),
+            "id": chunk_id(text, meta),
             "text": text,
-            "metadata": {"type": "summary", "building": b, "source": "Schedule"},
+            "metadata": meta,
         })
 
     return row_chunks, summary_chunks
@@ -118,28 +207,100 @@ def _sanitize_metadata(meta: dict) -> dict:
     return clean
 
 
+def _embedding_model_id(model) -> str:
+    """Identifies what produced a vector: int8 ONNX, fp32 CPU and fp16 GPU outputs differ slightly."""
+    backend = getattr(model, "backend", "torch")
+    device = getattr(getattr(model, "device", None), "type", "cpu")
+    onnx_file = EMBED_ONNX_FILE if backend == "onnx" else ""
+    return f"{EMBED_MODEL_NAME}|{backend}|{onnx_file}|{device}"
+
+
+def _encode_documents(model, documents: List[str]):
+    model_id = _embedding_model_id(model)
+    keys = [make_cache_key(doc, model_id) for doc in documents]
+
+    # One batched lookup and one commit per call, not a query + commit per chunk
+    hits = _EMBED_CACHE.get_many(keys)
+    missing = []
+    cached = {}
+    for i, key in enumerate(keys):
+        hit = hits.get(key)
+        if hit is None:
+            missing.append(i)
+        else:
+            cached[i] = np.frombuffer(base64.b64decode(hit), dtype=np.float32)
+
+    if missing:
+        # encode() already length-sorts inputs internally ("smart batching") and restores order.
+        # Normalized vectors make the collection's cosine space a plain inner product.
+        fresh = model.encode(
+            [documents[i] for i in missing],
+            batch_size=EMBED_BATCH_SIZE,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        ).astype(np.float32, copy=False)
+        for i, vec in zip(missing, fresh):
+            cached[i] = vec
+        _EMBED_CACHE.set_many({keys[i]: base64.b64encode(vec.tobytes()).decode("ascii") for i, vec in zip(missing, fresh)})
+
+    # The ndarray goes straight to Chroma: no per-float Python boxing via tolist().
+    return np.stack([cached[i] for i in range(len(documents))])
+
+
 def index_chunks_to_chroma(row_chunks: List[Dict], summary_chunks: List[Dict], persist_dir="./chroma_db") -> int:
     client = _get_chroma(persist_dir)
     model = _get_model()
 
     collection = client.get_or_create_collection(
-        name="project_docs",
-        metadata={"hnsw:space": "cosine"},
+        name=COLLECTION_NAME,
+        metadata=COLLECTION_METADATA,
     )
 
     all_chunks = row_chunks + summary_chunks
-
-    documents = [c["text"] for c in all_chunks]
-    metadatas = [_sanitize_metadata(c["metadata"]) for c in all_chunks]
-    ids = [c["id"] for c in all_chunks]
-    embeddings = model.encode(documents).tolist()
-
-    collection.add(
-        documents=documents,
-        metadatas=metadatas,
-        ids=ids,
-        embeddings=embeddings,
-    )
+    # Chroma rejects writes above the client's max_batch_size (SQLite variable limit)
+    batch_size = min(INDEX_BATCH_SIZE, client.max_batch_size)
+
+    # Ids are content hashes and every vector is stamped with the model that produced it, so an
+    # id already stored with this model's stamp holds this exact text + vector. Skipping those makes
+    # re-ingest and task retries only encode/write what's new; vectors from another embedding
+    # backend (e.g. the old torch fp32 default) are re-encoded so queries never hit stale vectors.
+    model_id = _embedding_model_id(model)
+    existing = set()
+    stale = 0
+    for i in range(0, len(all_chunks), batch_size):
+        ids = [c["id"] for c in all_chunks[i:i + batch_size]]
+        stored = collection.get(ids=ids, include=["metadatas"])
+        for chunk_id, meta in zip(stored["ids"], stored["metadatas"]):
+            if (meta or {}).get("embed_model") == model_id:
+                existing.add(chunk_id)
+            else:
+                stale += 1
+    if stale:
+        logger.warning(f"[Chroma] {stale} chunks were embedded by another model, re-encoding them with {model_id}.")
+    if existing:
+        logger.info(f"[Chroma] {len(existing)} chunks already indexed, skipping them.")
+        all_chunks = [c for c in all_chunks if c["id"] not in existing]
+
+    batches = [all_chunks[i:i + batch_size] for i in range(0, len(all_chunks), batch_size)]
+    if not batches:
+        return 0
+
+    # Bounded memory: only the batch being written and the one being encoded are alive.
+    # Encoding (torch / onnxruntime release the GIL) overlaps with the previous batch's insert.
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending = executor.submit(_encode_documents, model, [c["text"] for c in batches[0]])
+
+        for i, batch in enumerate(batches):
+            embeddings = pending.result()
+            if i + 1 < len(batches):
+                pending = executor.submit(_encode_documents, model, [c["text"] for c in batches[i + 1]])
+
+            collection.upsert(
+                documents=[c["text"] for c in batch],
+                metadatas=[{**_sanitize_metadata(c["metadata"]), "embed_model": model_id} for c in batch],
+                ids=[c["id"] for c in batch],
+                embeddings=embeddings,
+            )
 
     return len(all_chunks)
-
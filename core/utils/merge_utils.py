@@ -4,11 +4,14 @@ from core.utils.parse_utils import _parse_date_flexible
 
 def merge_tasks(task_list: List[Any]) -> List[TaskSchema]:
     final: Dict[int, Dict] = {}
+    # IDs whose merged fields all came from already-validated TaskSchema inputs
+    validated = set()
 
     for t in task_list:
+        from_schema = isinstance(t, TaskSchema)
 
         # 1. Normalize input to Dict
-        if isinstance(t, TaskSchema):
+        if from_schema:
             # Support both Pydantic v1 and v2
             t = t.model_dump() if hasattr(t, "model_dump") else t.dict()
         elif not isinstance(t, dict):
@@ -35,8 +38,13 @@ def merge_tasks(task_list: List[Any]) -> List[TaskSchema]:
         # 4. Merge Logic
         if tid not in final:
             final[tid] = t
+            if from_schema:
+                validated.add(tid)
             continue
 
+        if not from_schema:
+            validated.discard(tid)
+
         # Strategy: Prefer the entry with the longer task_name (usually better detail)
         old = final[tid]
         new_name = str(t.get("task_name", ""))
@@ -55,4 +63,8 @@ def merge_tasks(task_list: List[Any]) -> List[TaskSchema]:
         if not old.get("duration_days") and t.get("duration_days"):
             final[tid]["duration_days"] = t["duration_days"]
 
-    return [TaskSchema(**v) for v in final.values()]
\ No newline at end of file
+    # Re-validating model_dump() output is pure overhead; only raw (LLM) dicts need it
+    return [
+        TaskSchema.model_construct(**v) if tid in validated else TaskSchema(**v)
+        for tid, v in final.items()
+    ]
\ No newline at end of file
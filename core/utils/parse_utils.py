@@ -1,17 +1,19 @@
 # core/utils/parse_utils.py
 import re
+from functools import lru_cache
 from typing import List, Any, Dict, Optional
-from datetime import datetime
+from datetime import date, datetime
 from loguru import logger
 from pipeline.schemas import TaskSchema
 
+# \s already covers \n and \t, so one substitution does all the whitespace collapsing
+_WS_RE = re.compile(r"\s+")
+
 def _clean_text(s: Optional[str]) -> str:
     """Normalize whitespace and remove weird characters."""
     if not s:
         return ""
-    s = str(s).replace("\n", " ").replace("\t", " ")
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+    return _WS_RE.sub(" ", str(s)).strip()
 
 def _clean_task_name(name: Optional[str]) -> Optional[str]:
     """Reject impossible task names and sanitize."""
@@ -30,35 +32,70 @@ def _parse_int_safe(x) -> Optional[int]:
     """Parse ID-only integers."""
     if x is None: return None
     s = str(x).strip()
-    if not re.fullmatch(r"\d+", s): return None
+    # Same as fullmatch(r"\d+") without the regex; isascii() keeps out digits int() rejects (e.g. "²")
+    if not (s.isascii() and s.isdigit()): return None
     val = int(s)
     if val > 99999: return None # Reject merged cells
     return val
 
+_DUR_DAYS_RE = re.compile(r"(\d+)\s*d")
+_DIGITS_RE = re.compile(r"(\d+)")
+
 def _parse_duration(s: Optional[str]) -> int:
     """Extract integer days from string."""
     if not s: return 0
     s = str(s).lower().strip()
     # Match "10 d", "10 days", or just "10"
-    m = re.search(r"(\d+)\s*d", s) or re.search(r"(\d+)", s)
-    if m:
-        try:
-            return int(m.group(1))
-        except:
-            return 0
-    return 0
+    m = _DUR_DAYS_RE.search(s) or _DIGITS_RE.search(s)
+    # A matched group is all digits, so int() can't raise here
+    return int(m.group(1)) if m else 0
 
 DATE_FORMATS = [
     "%d-%b-%y", "%d-%b-%Y", "%Y-%m-%d",
     "%m/%d/%y", "%m/%d/%Y", "%d.%m.%y"
 ]
 
+# Precompiled equivalents of DATE_FORMATS, as (regex, group order)
+_DATE_PATTERNS = [
+    (re.compile(r"(\d{1,2})-([A-Za-z]{3})-(\d{2}|\d{4})"), "dmy"),  # 01-Jan-20 / 01-Jan-2020
+    (re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})"), "ymd"),            # 2020-01-31
+    (re.compile(r"(\d{1,2})/(\d{1,2})/(\d{2}|\d{4})"), "mdy"),      # 01/31/20 / 01/31/2020
+    (re.compile(r"(\d{1,2})\.(\d{1,2})\.(\d{2})"), "dmy"),          # 31.01.20
+]
+
+_MONTHS = {m: i for i, m in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], start=1
+)}
+
+# Pure function returning immutable dates; repeated date strings across rows become a dict lookup
+@lru_cache(maxsize=4096)
 def _parse_date_flexible(s: Optional[str]):
     if not s: return None
     s = _clean_text(s)
     # Basic cleanup for OCR noise
     s = s.replace("|", "").replace("l", "1").strip()
 
+    # Fast path: one regex match + date() instead of raising through each strptime format
+    for pattern, order in _DATE_PATTERNS:
+        m = pattern.fullmatch(s)
+        if not m: continue
+        parts = dict(zip(order, m.groups()))
+
+        month = parts["m"]
+        month = _MONTHS.get(month.lower()) if month.isalpha() else int(month)
+        if month is None: return None
+
+        year = int(parts["y"])
+        if len(parts["y"]) == 2:
+            # Same pivot as strptime's %y
+            year += 2000 if year < 69 else 1900
+
+        try:
+            return date(year, month, int(parts["d"]))
+        except ValueError:
+            # e.g. 31-Feb: strptime rejects it too
+            return None
+
     for fmt in DATE_FORMATS:
         try:
             return datetime.strptime(s, fmt).date()
@@ -66,21 +103,41 @@ def _parse_date_flexible(s: Optional[str]):
             continue
     return None
 
-def safe_task_to_dict(t: Any) -> Dict:
-    """Convert TaskSchema or dict to plain dict."""
-    if t is None: return {}
-    if isinstance(t, dict): return t
-    if hasattr(t, "model_dump"): return t.model_dump()
-    if hasattr(t, "dict"): return t.dict()
+_TASK_FIELDS = ["task_id", "task_name", "duration_days", "start_date", "finish_date"]
 
+def _fields_to_dict(t: Any) -> Dict:
     out = {}
-    for k in ["task_id", "task_name", "duration_days", "start_date", "finish_date"]:
+    for k in _TASK_FIELDS:
         if hasattr(t, k):
             val = getattr(t, k)
             if isinstance(val, datetime): val = val.date().isoformat()
             out[k] = val
     return out
 
+def _pick_converter(cls: type):
+    if issubclass(cls, dict): return lambda t: t
+    if hasattr(cls, "model_dump"): return cls.model_dump
+    if hasattr(cls, "dict"): return cls.dict
+    return _fields_to_dict
+
+# type(t) -> converter, resolved once per type instead of probing every object
+_CONVERTERS: Dict[type, Any] = {}
+
+def safe_task_to_dict(t: Any) -> Dict:
+    """Convert TaskSchema or dict to plain dict."""
+    if t is None: return {}
+    cls = type(t)
+    convert = _CONVERTERS.get(cls)
+    if convert is None:
+        convert = _CONVERTERS[cls] = _pick_converter(cls)
+    return convert(t)
+
+# Header substring -> column key, in priority order (first match wins per cell)
+_HDR_KEYS = [
+    ("id", "id"), ("task", "task"), ("activity", "task"), ("dur", "dur"),
+    ("start", "start"), ("finish", "end"), ("end", "end"),
+]
+
 def normalize_table_for_llm(table_rows: List[List[str]]) -> List[List[str]]:
     """Reduces raw table to critical columns for LLM."""
     # Ensure _clean_text is available here
@@ -100,22 +157,16 @@ def normalize_table_for_llm(table_rows: List[List[str]]) -> List[List[str]]:
         col_map = {"id": None, "task": None, "dur": None, "start": None, "end": None}
         for idx, h in enumerate(header):
             lh = h.lower()
-            if "id" in lh: col_map["id"] = idx
-            elif "task" in lh or "activity" in lh: col_map["task"] = idx
-            elif "dur" in lh: col_map["dur"] = idx
-            elif "start" in lh: col_map["start"] = idx
-            elif "finish" in lh or "end" in lh: col_map["end"] = idx
+            key = next((k for sub, k in _HDR_KEYS if sub in lh), None)
+            if key: col_map[key] = idx
 
         if col_map["id"] is not None and col_map["task"] is not None:
             indices = [col_map.get(k) for k in ["id", "task", "dur", "start", "end"]]
-            norm = []
-            for r in rows[header_idx+1:]:
-                new_row = []
-                for i in indices:
-                    if i is not None and i < len(r): new_row.append(r[i])
-                    else: new_row.append("")
-                norm.append(new_row)
-            return norm
+            # Project every row onto the 5 critical columns in one pass
+            return [
+                [r[i] if i is not None and i < len(r) else "" for i in indices]
+                for r in rows[header_idx+1:]
+            ]
 
     # Fallback
     return [r[:5] for r in rows]
@@ -125,20 +176,22 @@ def _parse_raw_table_rows(table_rows: List[List[str]], source_file: str, page_nu
     Parses raw table rows into TaskSchema objects using regex/heuristics.
     """
     tasks = []
-    rows = [[_clean_text(c) for c in row] for row in table_rows]
 
     # Skip potential header
     start_idx = 0
-    if rows and "id" in rows[0][0].lower():
+    if table_rows and table_rows[0] and "id" in _clean_text(table_rows[0][0]).lower():
         start_idx = 1
 
-    for r in rows[start_idx:]:
-        if not r or not any(r): continue
+    for row in table_rows[start_idx:]:
+        if not row: continue
 
-        # ID Check
-        t_id = _parse_int_safe(r[0]) if len(r) > 0 else None
+        # ID Check first: most non-task rows die here, before any other cell is cleaned
+        t_id = _parse_int_safe(_clean_text(row[0]))
         if not t_id: continue
 
+        # Only the 5 mapped columns are read; don't clean the rest
+        r = [_clean_text(c) for c in row[:5]]
+
         # Name Check
         t_name = _clean_task_name(r[1]) if len(r) > 1 else None
         if not t_name: continue
@@ -1,6 +1,8 @@
 # core/utils/table_parser.py
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+import httpx
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict
 from loguru import logger
 
@@ -12,6 +14,8 @@ class LLMTableParser:
         self.llm = LLMClient()
         self.max_rows_per_chunk = int(os.getenv("EXTRACT_MAX_ROWS_PER_CHUNK", "5"))
         self.workers = int(os.getenv("EXTRACT_LLM_WORKERS", "2"))
+        # HTTP/2 multiplexes the chunk requests on one connection; EXTRACT_LLM_HTTP2=0 forces HTTP/1.1
+        self.http2 = os.getenv("EXTRACT_LLM_HTTP2", "1") == "1"
 
         logger.info(f"[LLM Table Parser] Initialized with Chunk Size: {self.max_rows_per_chunk}, Workers: {self.workers}")
 
@@ -41,26 +45,46 @@ class LLMTableParser:
         if not normalized:
             return []
 
-        # Create chunks based on the configured size (now 5)
+        # Create chunks based on the configured size
         chunks = [normalized[i:i + self.max_rows_per_chunk] for i in range(0, len(normalized), self.max_rows_per_chunk)]
 
-        all_tasks = []
         logger.info(f"[Table Parser] Processing {len(chunks)} chunks for page {page_num}...")
+        prompts = [self._build_chunk_prompt(chunk, page_num) for chunk in chunks]
+        results = self._run(self._parse_all(prompts))
+
+        all_tasks = []
+        for idx, result in enumerate(results):
+            if isinstance(result, Exception):
+                logger.error(f"[LLM-Parser] Chunk {idx} failed: {result}")
+                continue
+            tasks = result.get("tasks", [])
+            if tasks:
+                all_tasks.extend(tasks)
+
+        return all_tasks
+
+    @staticmethod
+    def _run(coro):
+        """asyncio.run(coro), on a worker thread when the caller is already inside an event loop."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coro)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, coro).result()
+
+    async def _parse_all(self, prompts: List[str]) -> list:
+        """
+        Sends every chunk prompt over one keep-alive client (HTTP/2 unless
+        EXTRACT_LLM_HTTP2=0), at most EXTRACT_LLM_WORKERS at a time. Failures come
+        back as exceptions in their chunk's slot instead of cancelling the rest.
+        """
+        sem = asyncio.Semaphore(self.workers)
+        limits = httpx.Limits(max_connections=self.workers, max_keepalive_connections=self.workers)
+
+        async with httpx.AsyncClient(http2=self.http2, limits=limits) as client:
+            async def sem_wrapped(prompt):
+                async with sem:
+                    return await self.llm.aparse_table_chunk(client, prompt=prompt)
 
-        with ThreadPoolExecutor(max_workers=self.workers) as executor:
-            future_to_chunk = {}
-            for idx, chunk in enumerate(chunks):
-                prompt = self._build_chunk_prompt(chunk, page_num)
-                future = executor.submit(self.llm.parse_table_chunk, prompt=prompt)
-                future_to_chunk[future] = idx
-
-            for future in as_completed(future_to_chunk):
-                try:
-                    result = future.result()
-                    tasks = result.get("tasks", [])
-                    if tasks:
-                        all_tasks.extend(tasks)
-                except Exception as e:
-                    logger.error(f"[LLM-Parser] Chunk {future_to_chunk[future]} failed: {e}")
-
-        return all_tasks
\ No newline at end of file
+            return await asyncio.gather(*[sem_wrapped(p) for p in prompts], return_exceptions=True)
@@ -1,12 +1,15 @@
 # pipeline/api.py
+import os
 import chromadb
+import torch
 from ninja import NinjaAPI
 from typing import List
 from loguru import logger
-from sentence_transformers import SentenceTransformer, CrossEncoder
+from sentence_transformers import CrossEncoder
 
 from pipeline.schemas import TaskSchema, RuleSchema
 from pipeline.models import ProjectTask, RegulatoryRule
+from core.utils.chunk_utils import load_embedding_model, COLLECTION_NAME, COLLECTION_METADATA
 
 api = NinjaAPI(title="PropLens Context API")
 
@@ -15,18 +18,33 @@ api = NinjaAPI(title="PropLens Context API")
 # ==========================================
 # 1. Use the SAME path as chunk_utils
 CHROMA_PATH = "./chroma_db"
-# 2. Use the SAME collection name as chunk_utils
-COLLECTION_NAME = "project_docs"
-# 3. Use the SAME model as chunk_utils
-MODEL_NAME = "all-MiniLM-L6-v2"
+# 2. Use the SAME collection name + index settings as chunk_utils -> COLLECTION_NAME / COLLECTION_METADATA
+# 3. Use the SAME model (and backend) as chunk_utils -> load_embedding_model()
 
 # 4. Cross-Encoder for Re-ranking (High Accuracy)
 # This model is trained specifically to score how relevant a text is to a query.
 RERANK_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
-
-# Load model once (global cache)
+# "auto" = fp16 on GPU, fp32 on CPU (fp16 matmuls are emulated and slower there).
+# Set "bfloat16" on CPUs with native bf16 (AVX512-BF16 / AMX).
+RERANK_DTYPE = os.getenv("RERANK_DTYPE", "auto")
+RERANK_DTYPES = {"float32": torch.float32, "float16": torch.float16, "bfloat16": torch.bfloat16}
+
+# Retrieve a wide ANN candidate pool, re-rank it exactly with the Cross-Encoder, return the best few
+RETRIEVE_K = int(os.getenv("RETRIEVE_K", "50"))
+RERANK_BATCH_SIZE = 32
+TOP_N = 5
+
+# Skip the Cross-Encoder when the ANN winner is unambiguous: close to the query (cosine
+# distance) AND clearly ahead of the runner-up. Typical for exact task_id / rule_id lookups.
+# Both thresholds assume COLLECTION_METADATA's "hnsw:space": "cosine" (distance 0..2);
+# on an l2 / ip collection the distances are on another scale and need retuning.
+RERANK_SKIP_MAX_DISTANCE = float(os.getenv("RERANK_SKIP_MAX_DISTANCE", "0.25"))
+RERANK_SKIP_MARGIN = float(os.getenv("RERANK_SKIP_MARGIN", "0.1"))
+
+# Load model / collection once (global cache)
 _SEARCH_MODEL = None
 _RERANK_MODEL = None
+_COLLECTION = None
 
 def get_rerank_model():
     """Singleton to load the re-ranker model"""
@@ -34,19 +52,28 @@ def get_rerank_model():
     if _RERANK_MODEL is None:
         logger.info("Loading Cross-Encoder for Re-ranking...")
         # Use a small, fast model to minimize latency
-        _RERANK_MODEL = CrossEncoder(RERANK_MODEL_NAME)
+        dtype = RERANK_DTYPE
+        if dtype == "auto":
+            dtype = "float16" if torch.cuda.is_available() else "float32"
+        if dtype not in RERANK_DTYPES:
+            raise ValueError(f"RERANK_DTYPE={RERANK_DTYPE!r} not supported; use 'auto' or one of {sorted(RERANK_DTYPES)}")
+        _RERANK_MODEL = CrossEncoder(RERANK_MODEL_NAME, model_kwargs={"torch_dtype": RERANK_DTYPES[dtype]})
     return _RERANK_MODEL
 
 def get_search_model():
     global _SEARCH_MODEL
     if _SEARCH_MODEL is None:
         logger.info("Loading Embedding Model for Search...")
-        _SEARCH_MODEL = SentenceTransformer(MODEL_NAME)
+        _SEARCH_MODEL = load_embedding_model()
     return _SEARCH_MODEL
 
 def get_collection():
-    client = chromadb.PersistentClient(path=CHROMA_PATH)
-    return client.get_or_create_collection(name=COLLECTION_NAME)
+    """Singleton so /search doesn't rebuild the Chroma client on every request"""
+    global _COLLECTION
+    if _COLLECTION is None:
+        client = chromadb.PersistentClient(path=CHROMA_PATH)
+        _COLLECTION = client.get_or_create_collection(name=COLLECTION_NAME, metadata=COLLECTION_METADATA)
+    return _COLLECTION
 
 
 @api.get("/tasks", response=List[TaskSchema])
@@ -70,8 +97,8 @@ def semantic_search(request, query: str):
         collection = get_collection()
         results = collection.query(
             query_embeddings=query_vec,
-            n_results=5,
-            include=["documents", "metadatas"]
+            n_results=RETRIEVE_K,
+            include=["documents", "metadatas", "distances"]
         )
 
         if not results or not results['documents']:
@@ -80,29 +107,47 @@ def semantic_search(request, query: str):
         retrieved_docs = results['documents'][0]
         retrieved_metas = results['metadatas'][0]
 
-        cross_model = get_rerank_model()
-
-        sentence_combinations = [[query, doc_text] for doc_text in retrieved_docs]
-
-        similarity_scores = cross_model.predict(sentence_combinations)
-
-        scored_results = []
-        for idx, score in enumerate(similarity_scores):
-            scored_results.append({
-                "content": retrieved_docs[idx],
-                "meta": retrieved_metas[idx],
-                "score": float(score)  # Convert numpy float to python float
-            })
-
-        # Sort DESCENDING by the new Cross-Encoder score
+        distances = results['distances'][0]
+
+        if len(distances) >= 2 and distances[0] < RERANK_SKIP_MAX_DISTANCE and distances[1] - distances[0] > RERANK_SKIP_MARGIN:
+            # Chroma already returns candidates nearest-first; score is cosine similarity (1 - distance, -1..1) here
+            scorer = "cosine_similarity"
+            scored_results = [
+                {"content": doc, "meta": meta, "score": 1.0 - float(dist)}
+                for doc, meta, dist in zip(retrieved_docs, retrieved_metas, distances)
+            ]
+        else:
+            # Raw Cross-Encoder logits: a different scale from the cosine similarity above
+            scorer = "cross_encoder"
+            cross_model = get_rerank_model()
+
+            sentence_combinations = [[query, doc_text] for doc_text in retrieved_docs]
+
+            # Batched forward passes over all candidates (padded to the longest), no tqdm bar per request
+            similarity_scores = cross_model.predict(
+                sentence_combinations,
+                batch_size=RERANK_BATCH_SIZE,
+                show_progress_bar=False,
+            )
+
+            scored_results = []
+            for idx, score in enumerate(similarity_scores):
+                scored_results.append({
+                    "content": retrieved_docs[idx],
+                    "meta": retrieved_metas[idx],
+                    "score": float(score)  # Convert numpy float to python float
+                })
+
+        # Sort DESCENDING by score (Cross-Encoder, or similarity on the skip path)
         scored_results.sort(key=lambda x: x["score"], reverse=True)
 
         final_output = []
-        for item in scored_results[:5]:  # Take only the top 5 winners
+        for item in scored_results[:TOP_N]:  # Take only the top winners
             meta = item["meta"]
             final_output.append({
                 "content": item["content"],
                 "score": item["score"], # Helpful for debugging relevance
+                "scorer": scorer, # Which scale "score" is on: cosine_similarity or cross_encoder
                 "source": meta.get("source", "Unknown"),
                 "type": meta.get("type", "Unknown"),
                 "building": meta.get("building", "Unknown")
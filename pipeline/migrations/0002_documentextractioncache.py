@@ -0,0 +1,27 @@
+# Generated by Django 4.2.16 on 2026-10-15 22:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pipeline', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentExtractionCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_hash', models.CharField(max_length=64)),
+                ('doc_type', models.CharField(max_length=64)),
+                ('payload', models.JSONField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='documentextractioncache',
+            constraint=models.UniqueConstraint(fields=('file_hash', 'doc_type'), name='uniq_extraction_per_doc_type'),
+        ),
+    ]
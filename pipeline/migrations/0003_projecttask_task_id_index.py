@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-15 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pipeline', '0002_documentextractioncache'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='projecttask',
+            name='task_id',
+            field=models.IntegerField(db_index=True),
+        ),
+    ]
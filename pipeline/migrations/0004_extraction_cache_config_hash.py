@@ -0,0 +1,26 @@
+# Generated by Django 4.2.16 on 2026-10-15 23:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pipeline', '0003_projecttask_task_id_index'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='documentextractioncache',
+            name='uniq_extraction_per_doc_type',
+        ),
+        migrations.AddField(
+            model_name='documentextractioncache',
+            name='config_hash',
+            field=models.CharField(default='', max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='documentextractioncache',
+            constraint=models.UniqueConstraint(fields=('file_hash', 'doc_type', 'config_hash'), name='uniq_extraction_per_config'),
+        ),
+    ]
@@ -2,7 +2,8 @@
 from django.db import models
 
 class ProjectTask(models.Model):
-    task_id = models.IntegerField()
+    # Indexed for lookups; not unique: task IDs are numbered per schedule (1..N)
+    task_id = models.IntegerField(db_index=True)
     task_name = models.TextField(null=True, blank=True)
     duration_days = models.IntegerField(null=True, blank=True)
     start_date = models.DateField(null=True, blank=True)
@@ -17,4 +18,23 @@ class RegulatoryRule(models.Model):
     measurement_basis = models.TextField()
 
     def __str__(self):
-        return self.rule_id
\ No newline at end of file
+        return self.rule_id
+
+class DocumentExtractionCache(models.Model):
+    """
+    Extractor output per (PDF content hash, doc type, extractor settings hash), so re-ingesting
+    an unchanged file with unchanged models/prompts skips the VLM.
+    """
+    file_hash = models.CharField(max_length=64)
+    doc_type = models.CharField(max_length=64)
+    config_hash = models.CharField(max_length=64, default="")
+    payload = models.JSONField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["file_hash", "doc_type", "config_hash"], name="uniq_extraction_per_config"),
+        ]
+
+    def __str__(self):
+        return f"{self.doc_type}: {self.file_hash[:12]}"
@@ -1,5 +1,6 @@
 from ninja import Schema
-from typing import Optional, Union
+from pydantic import TypeAdapter
+from typing import List, Optional, Union
 from datetime import date
 
 class RuleSchema(Schema):
@@ -16,4 +17,7 @@ class TaskSchema(Schema):
 
     duration_days: Optional[int] = None
     start_date: Optional[date] = None
-    finish_date: Optional[date] = None
\ No newline at end of file
+    finish_date: Optional[date] = None
+
+# One compiled validator for a whole page of tasks instead of N TaskSchema(...) calls
+TASKS_ADAPTER = TypeAdapter(List[TaskSchema])
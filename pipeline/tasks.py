@@ -2,7 +2,8 @@
 import os
 import sys
 import django
-import uuid
+import hashlib
+from itertools import islice
 from loguru import logger
 from pathlib import Path
 from prefect import task
@@ -16,23 +17,114 @@ try:
 except RuntimeError:
     pass
 
-from core.extractor import DocumentExtractor
-from pipeline.models import RegulatoryRule, ProjectTask
-from core.utils.chunk_utils import index_chunks_to_chroma, aggregate_tasks_by_building, create_semantic_chunks
+from django.db import transaction
+from pipeline.models import RegulatoryRule, ProjectTask, DocumentExtractionCache
+from pipeline.schemas import TaskSchema, RuleSchema
+from core.utils.cache_utils import make_cache_key
+from core.utils.chunk_utils import index_chunks_to_chroma, aggregate_tasks_by_building, create_semantic_chunks, chunk_id
+
+# Rows per INSERT statement: bounded statement size / parameter count, few round trips
+BULK_BATCH_SIZE = 500
+
+def _bulk_create_batched(model, objs):
+    """
+    bulk_create() list()s whatever it's given, so a generator alone doesn't help.
+    Feed it BULK_BATCH_SIZE model instances at a time: only one batch is alive,
+    and the outer transaction keeps it a single commit.
+    """
+    it = iter(objs)
+    with transaction.atomic():
+        while batch := list(islice(it, BULK_BATCH_SIZE)):
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+
+def _extract_ura(extractor, file_path: str):
+    # Page images are exported alongside the rules; a cache hit returns before this
+    # runs, so images from an earlier run are left as they are
+    extractor.extract_images_from_ura(file_path)
+    return extractor.extract_ura_rules_vision(file_path)
+
+def _extract_schedule(extractor, file_path: str):
+    return extractor.extract_project_schedule_vision(file_path)
+
+# Per doc type: extraction handler, and schema used to (de)serialize its cached output
+EXTRACTORS = {"ura_circular": _extract_ura, "project_schedule": _extract_schedule}
+EXTRACTION_SCHEMAS = {"ura_circular": RuleSchema, "project_schedule": TaskSchema}
+
+def _rule_row(item) -> RegulatoryRule:
+    return RegulatoryRule(
+        rule_id=str(item.rule_id)[:250], # Safety clip for ID
+        rule_summary=item.rule_summary,
+        measurement_basis=item.measurement_basis
+    )
+
+def _task_row(item) -> ProjectTask:
+    return ProjectTask(
+        task_id=item.task_id,
+        # Safety: Ensure task_name is a string
+        task_name=str(item.task_name) if item.task_name else "", # TextField can now hold this, no matter the length
+        duration_days=item.duration_days,
+        start_date=item.start_date,
+        finish_date=item.finish_date,
+    )
+
+# Per doc type: Django model + schema -> model instance builder
+LOADERS = {"ura_circular": (RegulatoryRule, _rule_row), "project_schedule": (ProjectTask, _task_row)}
+
+def _file_sha256(file_path: str) -> str:
+    """
+    SHA-256 of the file, streamed in 1 MiB chunks so large PDFs aren't loaded whole.
+    readinto() refills one preallocated buffer instead of allocating a new bytes per chunk
+    (what hashlib.file_digest does on 3.11+).
+    """
+    h = hashlib.sha256()
+    buf = bytearray(1 << 20)
+    view = memoryview(buf)
+    with open(file_path, "rb", buffering=0) as f:
+        while n := f.readinto(buf):
+            h.update(view[:n])
+    return h.hexdigest()
 
 @task(name="Extract Data", log_prints=True)
 def extract_document_task(file_path: str, doc_type: str):
-    extractor = DocumentExtractor()
-    logger.info(f"Starting extraction for: {file_path}")
+    logger.info("Starting extraction for: {}", file_path)
+
+    if doc_type not in EXTRACTORS:
+        return []
+    schema = EXTRACTION_SCHEMAS[doc_type]
 
-    if doc_type == "ura_circular":
-        extractor.extract_images_from_ura(file_path)
-        return extractor.extract_ura_rules_vision(file_path)
+    # Imported here: pdfium/httpx are only needed by this task, not by workers that just
+    # transform or load (sys.modules makes repeats free). Building an extractor waits for a miss.
+    from core.extractor import DocumentExtractor, extraction_config
 
-    elif doc_type == "project_schedule":
-        return extractor.extract_project_schedule_vision(file_path)
+    # Same bytes + same extractor settings (models, prompts, fast path) -> same extraction.
+    # A hit costs a file hash + one row load: no extractor setup, no page rendering.
+    # EXTRACT_CACHE_DISABLE=1 forces a fresh VLM pass.
+    use_cache = os.getenv("EXTRACT_CACHE_DISABLE") != "1"
+    file_hash = _file_sha256(file_path)
+    config_hash = make_cache_key(extraction_config(doc_type))
 
-    return []
+    if use_cache:
+        cached = DocumentExtractionCache.objects.filter(file_hash=file_hash, doc_type=doc_type, config_hash=config_hash).first()
+        if cached is not None:
+            logger.info("Extraction cache hit for {} ({} records), skipping VLM.", file_path, len(cached.payload))
+            return [schema(**r) for r in cached.payload]
+
+    extractor = DocumentExtractor()
+    result = EXTRACTORS[doc_type](extractor, file_path)
+
+    # Empty or partial results are failures (VLM down, a page timed out or didn't parse);
+    # don't pin them in the cache, so the next run retries those pages
+    if extractor.failed_pages:
+        logger.warning("{} page(s) of {} failed; not caching this extraction.", extractor.failed_pages, file_path)
+    elif use_cache and result:
+        DocumentExtractionCache.objects.update_or_create(
+            file_hash=file_hash,
+            doc_type=doc_type,
+            config_hash=config_hash,
+            defaults={"payload": [item.model_dump(mode="json") for item in result]},
+        )
+
+    return result
 
 @task(name="Transform Schedule Data", log_prints=True)
 def transform_schedule_task(data):
@@ -44,69 +136,43 @@ def transform_schedule_task(data):
     summaries = aggregate_tasks_by_building(data)
     row_chunks, summary_chunks = create_semantic_chunks(data, summaries)
 
-    logger.info(f"Created {len(row_chunks)} row chunks and {len(summary_chunks)} summary chunks.")
+    logger.info("Created {} row chunks and {} summary chunks.", len(row_chunks), len(summary_chunks))
     return (row_chunks, summary_chunks)
 
+def _rule_chunk(rule) -> dict:
+    # Create a rich text representation for the AI
+    text = f"Rule {rule.rule_id}: {rule.rule_summary}. Measurement Basis: {rule.measurement_basis}"
+    meta = {"source": "URA-Circular", "type": "rule", "rule_id": str(rule.rule_id)}
+    return {"id": chunk_id(text, meta), "text": text, "metadata": meta}
+
 @task(name="Transform URA Data", log_prints=True)
 def transform_ura_task(data):
     if not data:
         return []
 
-    chunks = []
-    for rule in data:
-        # Create a rich text representation for the AI
-        text = f"Rule {rule.rule_id}: {rule.rule_summary}. Measurement Basis: {rule.measurement_basis}"
-
-        chunks.append({
-            "id": str(uuid.uuid4()),
-            "text": text,
-            "metadata": {
-                "source": "URA-Circular",
-                "type": "rule",
-                "rule_id": str(rule.rule_id)
-            }
-        })
-
-    logger.info(f"Created {len(chunks)} semantic chunks for URA rules.")
+    # Keyed by the content-hashed id: re-ingesting the circular upserts in place, and repeated
+    # rules collapse to one chunk (Chroma rejects duplicate ids within one write)
+    chunks = list({c["id"]: c for c in map(_rule_chunk, data)}.values())
+
+    logger.info("Created {} semantic chunks for URA rules.", len(chunks))
     return chunks
 
 @task(name="Load Postgres", log_prints=True)
 def load_to_postgres_task(data, doc_type: str):
     if not data:
-        print("No data to save to PostgreSQL.")
+        logger.info("No data to save to PostgreSQL.")
         return
 
-    print(f"Saving {len(data)} SQL records for: {doc_type}")
-
-    if doc_type == "ura_circular":
-        objs = [
-            RegulatoryRule(
-                rule_id=str(item.rule_id)[:250], # Safety clip for ID
-                rule_summary=item.rule_summary,
-                measurement_basis=item.measurement_basis
-            )
-            for item in data
-        ]
-        RegulatoryRule.objects.bulk_create(objs, ignore_conflicts=True)
-
-    elif doc_type == "project_schedule":
-        objs = []
-        for item in data:
-            # Safety: Ensure task_name is a string
-            safe_name = str(item.task_name) if item.task_name else ""
-
-            objs.append(
-                ProjectTask(
-                    task_id=item.task_id,
-                    task_name=safe_name, # TextField can now hold this, no matter the length
-                    duration_days=item.duration_days,
-                    start_date=item.start_date,
-                    finish_date=item.finish_date,
-                )
-            )
-        ProjectTask.objects.bulk_create(objs, ignore_conflicts=True)
-
-@task(name="Load Vector DB", retries = 3,  log_prints=True)
+    logger.info("Saving {} SQL records for: {}", len(data), doc_type)
+
+    if doc_type not in LOADERS:
+        return
+
+    model, build = LOADERS[doc_type]
+    _bulk_create_batched(model, (build(item) for item in data))
+
+# Backoff between retries; a retry only re-sends chunks that haven't landed (see index_chunks_to_chroma)
+@task(name="Load Vector DB", retries=3, retry_delay_seconds=[2, 8, 32], log_prints=True)
 def load_to_vector_db_task(chunks):
     if not chunks:
         logger.info("No chunks to save to Vector DB.")
@@ -122,4 +188,4 @@ def load_to_vector_db_task(chunks):
         row_chunks = chunks
 
     total = index_chunks_to_chroma(row_chunks, summary_chunks)
-    logger.info(f"Indexed {total} total semantic chunks into ChromaDB.")
\ No newline at end of file
+    logger.info("Indexed {} new semantic chunks into ChromaDB.", total)
\ No newline at end of file
@@ -0,0 +1,81 @@
+import hashlib
+
+import pytest
+
+from core.utils import cache_utils
+from core.utils.cache_utils import ResponseCache, make_cache_key
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_utils, "CACHE_DIR", tmp_path / ".llm_cache")
+    return tmp_path / ".llm_cache"
+
+
+class TestMakeCacheKey:
+
+    def test_stable_across_calls(self):
+        assert make_cache_key("prompt", "model", 0.0) == make_cache_key("prompt", "model", 0.0)
+
+    def test_known_digest(self):
+        """Pinned: a change here would orphan every existing cache entry"""
+        assert make_cache_key("a", 1) == hashlib.sha256(b'["a", 1]').hexdigest()
+
+    def test_dict_order_ignored(self):
+        assert make_cache_key({"a": 1, "b": 2}) == make_cache_key({"b": 2, "a": 1})
+
+    def test_parts_distinguished(self):
+        assert make_cache_key("ab", "c") != make_cache_key("a", "bc")
+
+
+class TestResponseCache:
+
+    def test_file_opened_lazily(self, cache_dir):
+        cache = ResponseCache("t")
+        assert not cache_dir.exists()
+        cache.get("k")
+        assert (cache_dir / "t.sqlite3").exists()
+
+    def test_round_trip_persists(self):
+        ResponseCache("t").set("k", "v")
+        assert ResponseCache("t").get("k") == "v"
+
+    def test_missing_key(self):
+        assert ResponseCache("t").get("nope") is None
+
+    def test_overwrite(self):
+        cache = ResponseCache("t")
+        cache.set("k", "v1")
+        cache.set("k", "v2")
+        assert ResponseCache("t").get("k") == "v2"
+
+    def test_get_many_set_many(self):
+        """More keys than one IN (...) batch; only present keys come back"""
+        items = {f"k{i}": str(i) for i in range(1200)}
+        ResponseCache("t").set_many(items)
+
+        found = ResponseCache("t").get_many(list(items) + ["missing"])
+        assert found == items
+
+    def test_get_many_mixes_memory_and_disk(self):
+        ResponseCache("t").set("disk", "1")
+        cache = ResponseCache("t")
+        cache.set("mem", "2")
+        assert cache.get_many(["disk", "mem", "none"]) == {"disk": "1", "mem": "2"}
+
+    def test_disabled(self, cache_dir):
+        cache = ResponseCache("t", enabled=False)
+        cache.set_many({"k": "v"})
+        assert cache.get("k") is None
+        assert cache.get_many(["k"]) == {}
+        assert not cache_dir.exists()
+
+    def test_unwritable_dir_falls_back_to_memory(self, tmp_path, monkeypatch):
+        blocker = tmp_path / "file"
+        blocker.write_text("")
+        monkeypatch.setattr(cache_utils, "CACHE_DIR", blocker / "sub")
+
+        cache = ResponseCache("t")
+        cache.set("k", "v")
+        assert cache.get("k") == "v"
+        assert cache.get_many(["k", "x"]) == {"k": "v"}
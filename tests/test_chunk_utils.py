@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from core.utils import chunk_utils
+from core.utils.cache_utils import ResponseCache
+
+
+class FakeModel:
+    """Stands in for the SentenceTransformer; `backend` feeds _embedding_model_id"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.encoded = 0
+
+    def encode(self, documents, **kwargs):
+        self.encoded += len(documents)
+        return np.random.default_rng(0).random((len(documents), 8), dtype=np.float32)
+
+
+@pytest.fixture
+def chroma(tmp_path, monkeypatch):
+    monkeypatch.setattr(chunk_utils, "_CHROMA", None)
+    monkeypatch.setattr(chunk_utils, "_EMBED_CACHE", ResponseCache("embeddings", enabled=False))
+    return str(tmp_path / "chroma")
+
+
+def _chunks(n):
+    return [{"id": f"id{i}", "text": f"chunk {i}", "metadata": {"type": "row", "building": None}} for i in range(n)]
+
+
+class TestIndexChunksToChroma:
+
+    def test_skips_chunks_indexed_by_same_model(self, chroma, monkeypatch):
+        model = FakeModel("onnx")
+        monkeypatch.setattr(chunk_utils, "_MODEL", model)
+
+        assert chunk_utils.index_chunks_to_chroma(_chunks(5), [], chroma) == 5
+        assert chunk_utils.index_chunks_to_chroma(_chunks(5), [], chroma) == 0
+        assert model.encoded == 5
+
+    def test_reencodes_chunks_from_another_model(self, chroma, monkeypatch):
+        monkeypatch.setattr(chunk_utils, "_MODEL", FakeModel("torch"))
+        chunk_utils.index_chunks_to_chroma(_chunks(5), [], chroma)
+
+        model = FakeModel("onnx")
+        monkeypatch.setattr(chunk_utils, "_MODEL", model)
+        assert chunk_utils.index_chunks_to_chroma(_chunks(5), [], chroma) == 5
+        assert model.encoded == 5
+
+        stored = chunk_utils._get_chroma(chroma).get_collection(chunk_utils.COLLECTION_NAME).get(include=["metadatas"])
+        assert {m["embed_model"] for m in stored["metadatas"]} == {chunk_utils._embedding_model_id(model)}
@@ -0,0 +1,62 @@
+import json
+
+from core.llm_client import _extract_json_span, _repair_json, _loads_json
+
+
+class TestJsonExtraction:
+
+    def test_extracts_object_from_chatty_response(self):
+        """Prose and markdown fences around the JSON are dropped"""
+        content = 'Sure! Here it is:\n```json\n{"tasks": [{"task_id": 1}]}\n```\nHope this helps.'
+        assert _extract_json_span(content) == '{"tasks": [{"task_id": 1}]}'
+
+    def test_ignores_brackets_inside_strings(self):
+        """Braces inside quoted values must not close the block early"""
+        content = '{"rule_summary": "GFA excludes {voids} and [ledges]"} trailing'
+        assert _extract_json_span(content) == '{"rule_summary": "GFA excludes {voids} and [ledges]"}'
+
+    def test_returns_first_block_only(self):
+        """Two JSON blocks in one reply: only the first is returned"""
+        assert _extract_json_span('[1, 2] and then {"a": 1}') == "[1, 2]"
+
+    def test_unclosed_block_falls_back_to_tail(self):
+        """Truncated responses keep everything from the first bracket"""
+        assert _extract_json_span('prefix {"a": [1, 2') == '{"a": [1, 2'
+
+    def test_no_json_returns_input(self):
+        assert _extract_json_span("no json here") == "no json here"
+
+
+class TestJsonRepair:
+
+    def test_python_style_dict(self):
+        """Single quotes and Python literals are converted to JSON"""
+        raw = "{'task_id': 3, 'task_name': 'Piling', 'done': True, 'finish_date': None}"
+        assert json.loads(_repair_json(raw)) == {
+            "task_id": 3, "task_name": "Piling", "done": True, "finish_date": None
+        }
+
+    def test_trailing_commas_removed(self):
+        assert json.loads(_repair_json('{"tasks": [1, 2, ], }')) == {"tasks": [1, 2]}
+
+    def test_quotes_inside_strings_preserved(self):
+        """Double quotes inside single-quoted strings are escaped, apostrophes kept"""
+        raw = """{'rule_summary': 'The "void" area isn\\'t counted'}"""
+        assert json.loads(_repair_json(raw)) == {"rule_summary": 'The "void" area isn\'t counted'}
+
+    def test_escaped_apostrophe_in_double_quotes(self):
+        raw = """{"rule_summary": "The void area isn\\'t counted"}"""
+        assert json.loads(_repair_json(raw)) == {"rule_summary": "The void area isn't counted"}
+
+    def test_literals_inside_strings_untouched(self):
+        assert json.loads(_repair_json('{"note": "None of the True values"}')) == {"note": "None of the True values"}
+
+
+class TestJsonLoads:
+
+    def test_fast_path(self):
+        assert _loads_json('{"rules": []}') == {"rules": []}
+
+    def test_raw_newline_in_string_falls_back(self):
+        """orjson rejects control characters in strings; the stdlib fallback accepts them"""
+        assert _loads_json('{"rule_summary": "line one\nline two"}') == {"rule_summary": "line one\nline two"}
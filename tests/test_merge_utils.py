@@ -0,0 +1,43 @@
+from datetime import date
+
+from core.utils.merge_utils import merge_tasks
+from pipeline.schemas import TaskSchema
+
+
+def _revalidated(tasks):
+    """What merge_tasks returned before: every merged task rebuilt through TaskSchema(**v)"""
+    return [TaskSchema(**t.model_dump()) for t in tasks]
+
+
+class TestMergeTasks:
+
+    def test_schema_inputs_skip_validation_but_match(self):
+        tasks = [
+            TaskSchema(task_id=1, task_name="Piling", duration_days=5, start_date="2024-01-01", finish_date="2024-01-06"),
+            TaskSchema(task_id="2", task_name="Pile caps", duration_days=None, start_date=None, finish_date=None),
+            TaskSchema(task_id=2, task_name="Pile caps - Block A", duration_days=3, start_date=date(2024, 1, 7)),
+        ]
+        merged = merge_tasks(tasks)
+
+        assert merged == _revalidated(merged)
+        assert [t.task_name for t in merged] == ["Piling", "Pile caps - Block A"]
+        assert merged[1].start_date == date(2024, 1, 7)
+        assert all(isinstance(t, TaskSchema) for t in merged)
+
+    def test_raw_dicts_are_validated(self):
+        merged = merge_tasks([
+            {"task_id": "3", "task_name": "Slab", "duration_days": "4", "start_date": "2024-02-01", "finish_date": "02/05/2024"},
+        ])
+        assert merged == [TaskSchema(task_id="3", task_name="Slab", duration_days=4,
+                                     start_date=date(2024, 2, 1), finish_date=date(2024, 2, 5))]
+        assert merged[0].duration_days == 4
+
+    def test_mixed_inputs_match_full_validation(self):
+        """A raw dict merged into a schema entry drops that id back to full validation"""
+        merged = merge_tasks([
+            TaskSchema(task_id=4, task_name="Walls", duration_days=None),
+            {"task_id": 4, "task_name": "Walls", "duration_days": "6"},
+            TaskSchema(task_id=5, task_name="Roof", duration_days=2),
+        ])
+        assert merged == _revalidated(merged)
+        assert merged[0].duration_days == 6
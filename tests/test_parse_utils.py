@@ -0,0 +1,70 @@
+from datetime import date, datetime
+
+import pytest
+
+from core.utils.parse_utils import DATE_FORMATS, _clean_text, _parse_date_flexible
+
+
+def _strptime_reference(s):
+    """The strptime loop _parse_date_flexible's precompiled fast path replaced"""
+    if not s: return None
+    s = _clean_text(s).replace("|", "").replace("l", "1").strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+CASES = [
+    # %d-%b-%y / %d-%b-%Y
+    ("01-Jan-20", date(2020, 1, 1)),
+    ("1-jan-20", date(2020, 1, 1)),
+    ("15-DEC-2019", date(2019, 12, 15)),
+    ("31-Mar-68", date(2068, 3, 31)),   # %y pivot: 00-68 -> 20xx
+    ("31-Mar-69", date(1969, 3, 31)),   # 69-99 -> 19xx
+    # %Y-%m-%d
+    ("2024-02-29", date(2024, 2, 29)),
+    ("2024-2-9", date(2024, 2, 9)),
+    # %m/%d/%y / %m/%d/%Y: month first, so 03/04 is March 4th
+    ("03/04/24", date(2024, 3, 4)),
+    ("03/04/2024", date(2024, 3, 4)),
+    ("12/31/99", date(1999, 12, 31)),
+    # %d.%m.%y: day first
+    ("03.04.24", date(2024, 4, 3)),
+    # OCR noise: pipes dropped, l read as 1
+    ("|01/3l/2020|", date(2020, 1, 31)),
+    ("  2020-01-31  ", date(2020, 1, 31)),
+]
+
+INVALID = [
+    None,
+    "",
+    "TBD",
+    "31/12/2024",     # day-first slashes: month 31
+    "2023-02-29",     # not a leap year
+    "31-Feb-20",
+    "01-Foo-20",
+    "01-Jul-20",      # the l -> 1 OCR fix turns "Jul" into "Ju1"
+    "13.13.24",
+    "03.04.2024",     # %d.%m.%y takes two-digit years only
+    "2024/01/31",
+    "01-Jan-202",
+    "Mon 01/01/24",
+]
+
+
+class TestParseDateFlexible:
+
+    @pytest.mark.parametrize("raw, expected", CASES)
+    def test_supported_formats(self, raw, expected):
+        assert _parse_date_flexible(raw) == expected
+
+    @pytest.mark.parametrize("raw", INVALID)
+    def test_invalid_dates(self, raw):
+        assert _parse_date_flexible(raw) is None
+
+    @pytest.mark.parametrize("raw", [c[0] for c in CASES] + INVALID)
+    def test_matches_strptime_loop(self, raw):
+        assert _parse_date_flexible(raw) == _strptime_reference(raw)
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from core.utils.table_parser import LLMTableParser
+
+ROWS = [["ID", "Task Name", "Duration", "Start", "Finish"]] + [
+    [str(i), f"Task {i}", "1 day", "01/01/2024", "02/01/2024"] for i in range(1, 13)
+]
+
+
+@pytest.fixture
+def parser(monkeypatch):
+    monkeypatch.delenv("EXTRACT_MAX_ROWS_PER_CHUNK", raising=False)
+    monkeypatch.delenv("EXTRACT_LLM_HTTP2", raising=False)
+    parser = LLMTableParser()
+    prompts = []
+
+    async def fake_chunk(client, prompt):
+        prompts.append(prompt)
+        # Chunks finish out of order; the second one fails
+        first_id = int(prompt.split("Table Data:")[1].split("|")[0])
+        await asyncio.sleep(0.01 if first_id == 1 else 0)
+        if first_id == 6:
+            raise RuntimeError("LLM down")
+        return {"tasks": [{"task_id": first_id}]}
+
+    parser.llm.aparse_table_chunk = fake_chunk
+    parser.prompts = prompts
+    return parser
+
+
+class TestParseTableHybrid:
+
+    def test_defaults(self, parser):
+        assert parser.max_rows_per_chunk == 5
+        assert parser.http2 is True
+
+    def test_http2_can_be_disabled(self, monkeypatch):
+        monkeypatch.setenv("EXTRACT_LLM_HTTP2", "0")
+        assert LLMTableParser().http2 is False
+
+    def test_chunks_in_order_and_failures_skipped(self, parser):
+        """12 rows -> chunks of 5/5/2; the failed chunk is dropped, the rest keep page order"""
+        tasks = parser.parse_table_hybrid(ROWS, page_num=3)
+        assert len(parser.prompts) == 3
+        assert tasks == [{"task_id": 1}, {"task_id": 11}]
+
+    def test_callable_from_running_loop(self, parser):
+        """e.g. an async Prefect task: asyncio.run would raise inside the caller's loop"""
+        async def caller():
+            return parser.parse_table_hybrid(ROWS)
+
+        assert asyncio.run(caller()) == [{"task_id": 1}, {"task_id": 11}]